@@ -1,31 +1,110 @@
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
 from apscheduler.jobstores.base import JobLookupError
 from collections import defaultdict
 from datetime import datetime
 from flask import request, session
 from flask_login import current_user
+from logging import error
 from napalm._SUPPORTED_DRIVERS import SUPPORTED_DRIVERS
 from netmiko.ssh_dispatcher import CLASS_MAPPER, FILE_TRANSFER_MAP
 from operator import itemgetter
 from pathlib import Path
-from re import search, sub
+from re import compile
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from threading import BoundedSemaphore
 from uuid import uuid4
 
 from eNMS.controller.base import BaseController
 from eNMS.database import Session
+from eNMS.database.associations import run_device_table, run_pool_table
 from eNMS.database.functions import delete, factory, fetch, fetch_all, objectify
+from eNMS.models import models
 
 
 class AutomationController(BaseController):
 
-    NETMIKO_DRIVERS = sorted((driver, driver) for driver in CLASS_MAPPER)
-    NETMIKO_SCP_DRIVERS = sorted((driver, driver) for driver in FILE_TRANSFER_MAP)
-    NAPALM_DRIVERS = sorted((driver, driver) for driver in SUPPORTED_DRIVERS[1:])
+    NETMIKO_DRIVERS = tuple((driver, driver) for driver in sorted(CLASS_MAPPER))
+    NETMIKO_SCP_DRIVERS = tuple(
+        (driver, driver) for driver in sorted(FILE_TRANSFER_MAP)
+    )
+    NAPALM_DRIVERS = tuple((driver, driver) for driver in sorted(SUPPORTED_DRIVERS[1:]))
     connections_cache = {"napalm": defaultdict(dict), "netmiko": defaultdict(dict)}
     service_db = defaultdict(lambda: {"runs": 0})
     run_db = defaultdict(dict)
     run_logs = defaultdict(list)
+    calendar_date_regex = compile(r"(\d+)-(\d+)-(\d+) (\d+):(\d+)")
+
+    def init_scheduler(self):
+        super().init_scheduler()
+        self.run_slots = BoundedSemaphore(self.config["scheduler"]["max_inflight_runs"])
+        self.inflight_runs = set()
+        self.scheduler.add_listener(
+            lambda event: self.release_run_slot(event.job_id),
+            EVENT_JOB_ERROR | EVENT_JOB_EXECUTED | EVENT_JOB_MISSED,
+        )
+        self.scheduler.add_job(
+            id="connections_cleanup",
+            func=self.clean_connections_cache,
+            trigger="interval",
+            seconds=self.config["connections"]["cleanup_interval"],
+            replace_existing=True,
+        )
+
+    @staticmethod
+    def clean_connections_cache():
+        controller = AutomationController
+        for library, cache in controller.connections_cache.items():
+            for runtime in list(cache):
+                if runtime in controller.run_db:
+                    continue
+                for device, connection in cache.pop(runtime, {}).items():
+                    try:
+                        if library == "netmiko":
+                            connection.disconnect()
+                        else:
+                            connection.close()
+                    except Exception as exc:
+                        error(f"Error closing {library} connection to {device} ({exc})")
+
+    def release_run_slot(self, runtime):
+        try:
+            self.inflight_runs.remove(runtime)
+        except KeyError:
+            return
+        self.run_slots.release()
+
+    def schedule_run(self, service_id, **kwargs):
+        if not self.run_slots.acquire(blocking=False):
+            return False
+        runtime = kwargs["runtime"]
+        new_runtime = runtime not in self.inflight_runs
+        self.inflight_runs.add(runtime)
+        try:
+            self.scheduler.add_job(
+                id=runtime,
+                func=self.run,
+                run_date=datetime.now(),
+                args=[service_id],
+                kwargs=kwargs,
+                trigger="date",
+            )
+        except Exception:
+            if new_runtime:
+                self.inflight_runs.discard(runtime)
+            self.run_slots.release()
+            raise
+        return True
 
     def stop_workflow(self, runtime):
+        if runtime in self.inflight_runs:
+            try:
+                self.scheduler.remove_job(runtime)
+            except JobLookupError:
+                pass
+            else:
+                self.release_run_slot(runtime)
+                return True
         run = fetch("run", allow_none=True, runtime=runtime)
         if run and run.run_state["status"] == "Running":
             run.run_state["status"] = "stop"
@@ -53,7 +132,9 @@ class AutomationController(BaseController):
 
     def copy_service_in_workflow(self, workflow_id, **kwargs):
         service_sets = list(set(kwargs["services"].split(",")))
-        service_instances = objectify("service", service_sets)
+        service_instances = objectify(
+            "service", service_sets, selectinload(models["service"].workflows)
+        )
         workflow = fetch("workflow", id=workflow_id)
         services, errors = [], []
         if kwargs["mode"] == "shallow":
@@ -70,18 +151,38 @@ class AutomationController(BaseController):
             else:
                 workflow.services.append(service)
             services.append(service)
-        workflow.last_modified = self.get_time()
+        now = self.get_time()
+        workflow.last_modified = now
         Session.commit()
         return {
             "services": [service.serialized for service in services],
-            "update_time": workflow.last_modified,
+            "update_time": now,
         }
 
     def clear_results(self, service_id):
-        for result in fetch(
-            "run", all_matches=True, allow_none=True, service_id=service_id
-        ):
-            Session.delete(result)
+        run_model = models["run"]
+        run_ids = select([run_model.id]).where(run_model.service_id == service_id)
+        for table in (run_device_table, run_pool_table):
+            Session.execute(table.delete().where(table.c.run_id.in_(run_ids)))
+        results = (
+            Session.query(models["result"])
+            .filter(models["result"].run_id.in_(run_ids))
+            .delete(synchronize_session=False)
+        )
+        Session.query(run_model).filter(run_model.parent_id.in_(run_ids)).update(
+            {"parent_id": None}, synchronize_session=False
+        )
+        runs = (
+            Session.query(run_model)
+            .filter_by(service_id=service_id)
+            .delete(synchronize_session=False)
+        )
+        service = fetch("service", id=service_id)
+        self.log(
+            "info",
+            f"DELETION: {runs} runs and {results} results of {service.type} "
+            f"'{service.name}'",
+        )
 
     def create_label(self, workflow_id, x, y, **kwargs):
         workflow, label_id = fetch("workflow", id=workflow_id), str(uuid4())
@@ -129,13 +230,16 @@ class AutomationController(BaseController):
         return {"logs": "\n".join(logs), "refresh": not bool(result)}
 
     def get_runtimes(self, type, id):
-        runs = fetch("run", allow_none=True, all_matches=True, service_id=id)
-        return sorted(
-            set(
-                (run.parent_runtime, f"{run.parent_runtime} (run by '{run.creator}')")
-                for run in runs
-            )
+        run = models["run"]
+        runs = (
+            Session.query(run.parent_runtime, run.creator)
+            .filter(run.service_id == id)
+            .distinct()
+            .order_by(run.parent_runtime, run.creator)
         )
+        return [
+            (runtime, f"{runtime} (run by '{creator}')") for runtime, creator in runs
+        ]
 
     def get_result(self, id):
         return fetch("result", id=id).result
@@ -224,15 +328,12 @@ class AutomationController(BaseController):
 
     def get_workflow_results(self, workflow, runtime):
         state = fetch("run", parent_runtime=runtime).result().result["state"]
+        service_runs = defaultdict(list)
+        for run in fetch_all("run", parent_runtime=runtime):
+            service_runs[run.service_id].append(run)
 
         def rec(service):
-            runs = fetch(
-                "run",
-                parent_runtime=runtime,
-                allow_none=True,
-                all_matches=True,
-                service_id=service.id,
-            )
+            runs = service_runs[service.id]
             if service.scoped_name in ("Start", "End") or not runs:
                 return
             progress = state["services"][service.id].get("progress")
@@ -301,14 +402,8 @@ class AutomationController(BaseController):
         service = fetch("service", id=service_id)
         kwargs["runtime"] = runtime = self.get_time()
         if kwargs.get("asynchronous", True):
-            self.scheduler.add_job(
-                id=self.get_time(),
-                func=self.run,
-                run_date=datetime.now(),
-                args=[service_id],
-                kwargs=kwargs,
-                trigger="date",
-            )
+            if not self.schedule_run(service_id, **kwargs):
+                return {"alert": "Too many services running: try again later."}
         else:
             service.run(runtime=runtime)
         return {"service": service.serialized, "runtime": runtime}
@@ -330,7 +425,7 @@ class AutomationController(BaseController):
         return now
 
     def skip_services(self, workflow_id, service_ids):
-        services = [fetch("service", id=id) for id in service_ids.split("-")]
+        services = objectify("service", service_ids.split("-"))
         skip = not all(service.skip for service in services)
         for service in services:
             service.skip = skip
@@ -357,40 +452,64 @@ class AutomationController(BaseController):
         }
 
     def convert_date(self, date):
-        python_month = search(r".*-(\d{2})-.*", date).group(1)
-        month = "{:02}".format((int(python_month) - 1) % 12)
-        return [
-            int(i)
-            for i in sub(
-                r"(\d+)-(\d+)-(\d+) (\d+):(\d+).*", r"\1," + month + r",\3,\4,\5", date
-            ).split(",")
-        ]
+        match = self.calendar_date_regex.match(date)
+        year, month, day, hour, minute = map(int, match.groups())
+        return [year, (month - 1) % 12, day, hour, minute]
 
     def calendar_init(self, type):
         results = {}
-        for instance in fetch_all(type):
-            if getattr(instance, "workflow", None):
-                continue
-            date = getattr(instance, "next_run_time" if type == "task" else "runtime")
-            if date:
-                results[instance.name] = {
-                    "start": self.convert_date(date),
-                    **instance.serialized,
+        if type == "task":
+            query = Session.query(models["task"])
+            jobs = {job.id: job for job in self.scheduler.get_jobs()}
+            for task in query.options(joinedload(models["task"].service)).all():
+                task.aps_job = jobs.get(task.aps_job_id)
+                if not task.service or not task.next_run_time:
+                    continue
+                results[task.name] = {
+                    "start": self.convert_date(task.next_run_time),
+                    "id": task.id,
+                    "description": task.description,
+                    "service": task.service.row_properties,
+                }
+        else:
+            run, service = models["run"], models["service"]
+            query = (
+                Session.query(
+                    run.id,
+                    run.runtime,
+                    run.creator,
+                    service.id,
+                    service.name,
+                    service.type,
+                )
+                .join(service, run.service)
+                .filter(run.workflow_id.is_(None))
+            )
+            for id, runtime, creator, *service_properties in query.all():
+                results[f"{runtime} (run by '{creator}')"] = {
+                    "start": self.convert_date(runtime),
+                    "id": id,
+                    "runtime": runtime,
+                    "service": dict(zip(("id", "name", "type"), service_properties)),
                 }
         return results
 
     def scheduler_action(self, action):
         getattr(self.scheduler, action)()
 
-    def task_action(self, action, task_id):
-        try:
-            return getattr(fetch("task", id=task_id), action)()
-        except JobLookupError:
-            return {"alert": "This task no longer exists."}
+    def task_action(self, action, task_ids):
+        missing_tasks = []
+        for task in objectify("task", task_ids.split("-")):
+            try:
+                getattr(task, action)()
+            except JobLookupError:
+                missing_tasks.append(task.name)
+        if missing_tasks:
+            names = ", ".join(missing_tasks)
+            return {"alert": f"These tasks no longer exist: {names}."}
 
     def scan_playbook_folder(self):
         path = Path(
             self.config["paths"]["playbooks"] or self.path / "files" / "playbooks"
         )
-        playbooks = [[str(f) for f in path.glob(e)] for e in ("*.yaml", "*.yml")]
-        return sorted(sum(playbooks, []))
+        return sorted(str(f) for e in ("*.yaml", "*.yml") for f in path.glob(e))
@@ -15,6 +15,7 @@ from json import load
 from ldap3 import ALL, Server
 from logging import basicConfig, error, info, StreamHandler, warning
 from logging.handlers import RotatingFileHandler
+from multiprocessing.pool import ThreadPool
 from os import environ, scandir
 from os.path import exists
 from pathlib import Path
@@ -26,7 +27,7 @@ from smtplib import SMTP
 from string import punctuation
 from sqlalchemy import and_, func, or_
 from sqlalchemy.exc import IntegrityError, InvalidRequestError
-from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm import configure_mappers, joinedload
 from sys import path as sys_path
 from tacacs_plus.client import TACACSClient
 from uuid import getnode
@@ -42,8 +43,8 @@ from eNMS.database.functions import (
     fetch_all,
     get_query_count,
 )
-from eNMS.models import models, relationships
-from eNMS.properties import private_properties, property_names
+from eNMS.models import model_properties, models, relationships
+from eNMS.properties import dont_serialize, private_properties, property_names
 from eNMS.properties.database import import_classes
 from eNMS.properties.diagram import (
     device_diagram_properties,
@@ -199,8 +200,9 @@ class BaseController:
             Session.commit()
 
     def clean_database(self):
-        for run in fetch("run", all_matches=True, allow_none=True, status="Running"):
-            run.status = "Aborted (app reload)"
+        Session.query(models["run"]).filter_by(status="Running").update(
+            {"status": "Aborted (app reload)"}, synchronize_session=False
+        )
         Session.commit()
 
     def fetch_version(self):
@@ -297,11 +299,11 @@ class BaseController:
             {
                 "apscheduler.jobstores.default": {
                     "type": "sqlalchemy",
-                    "url": "sqlite:///jobs.sqlite",
+                    "url": self.config["scheduler"]["jobstore_url"],
                 },
                 "apscheduler.executors.default": {
                     "class": "apscheduler.executors.pool:ThreadPoolExecutor",
-                    "max_workers": "50",
+                    "max_workers": str(self.config["scheduler"]["max_workers"]),
                 },
                 "apscheduler.job_defaults.misfire_grace_time": "5",
                 "apscheduler.job_defaults.coalesce": "true",
@@ -357,8 +359,7 @@ class BaseController:
         self.syslog_server.start()
 
     def update_parameters(self, **kwargs):
-        Session.query(models["parameters"]).one().update(**kwargs)
-        self.__dict__.update(**kwargs)
+        self.config.update(kwargs)
 
     def delete_instance(self, instance_type, instance_id):
         return delete(instance_type, id=instance_id)
@@ -370,7 +371,17 @@ class BaseController:
         return fetch(instance_type, id=id).get_properties()
 
     def get_all(self, instance_type):
-        return [instance.get_properties() for instance in fetch_all(instance_type)]
+        model = models[instance_type]
+        if len(model.__mapper__.self_and_descendants) > 1:
+            return [instance.get_properties() for instance in fetch_all(instance_type)]
+        properties = [
+            property
+            for property in dict.fromkeys(model_properties[instance_type])
+            if property not in dont_serialize.get(instance_type, [])
+            and property not in private_properties
+        ]
+        query = Session.query(*(getattr(model, property) for property in properties))
+        return [dict(zip(properties, row)) for row in query]
 
     def update(self, instance_type, **kwargs):
         try:
@@ -405,24 +416,37 @@ class BaseController:
         self.log_severity[severity](content)
 
     def count_models(self):
+        properties = {}
+        for instance_type in diagram_classes:
+            model, counter = models[instance_type], Counter()
+            property = type_to_diagram_properties[instance_type][0]
+            if instance_type == "task" and property == "status":
+                for status in ("Active", "Inactive"):
+                    query = Session.query(func.count(model.id))
+                    number = query.filter(model.status_constraint(status)).scalar()
+                    if number:
+                        counter[status] = number
+            else:
+                column = getattr(model, property)
+                query = Session.query(column, func.count()).group_by(column)
+                for value, number in query.all():
+                    counter[str(value)] += number
+            properties[instance_type] = counter
         return {
             "counters": {
                 instance_type: count(instance_type) for instance_type in diagram_classes
             },
-            "properties": {
-                instance_type: Counter(
-                    str(getattr(instance, type_to_diagram_properties[instance_type][0]))
-                    for instance in fetch_all(instance_type)
-                )
-                for instance_type in diagram_classes
-            },
+            "properties": properties,
         }
 
     def compare(self, type, result1, result2):
         first = self.str_dict(getattr(fetch(type, id=result1), "result")).splitlines()
         second = self.str_dict(getattr(fetch(type, id=result2), "result")).splitlines()
-        opcodes = SequenceMatcher(None, first, second).get_opcodes()
-        return {"first": first, "second": second, "opcodes": opcodes}
+        line_ids = {}
+        first_ids = [line_ids.setdefault(line, len(line_ids)) for line in first]
+        second_ids = [line_ids.setdefault(line, len(line_ids)) for line in second]
+        matcher = SequenceMatcher(None, first_ids, second_ids, autojunk=False)
+        return {"first": first, "second": second, "opcodes": matcher.get_opcodes()}
 
     def build_filtering_constraints(self, obj_type, **kwargs):
         model, constraints = models[obj_type], []
@@ -431,7 +455,9 @@ class BaseController:
             if not value:
                 continue
             filter = kwargs["form"].get(f"{property}_filter")
-            if value in ("bool-true", "bool-false"):
+            if obj_type == "task" and property == "status":
+                constraint = model.status_constraint(value, filter)
+            elif value in ("bool-true", "bool-false"):
                 constraint = getattr(model, property) == (value == "bool-true")
             elif filter == "equality":
                 constraint = getattr(model, property) == value
@@ -480,8 +506,12 @@ class BaseController:
         operator = and_ if kwargs["form"].get("operator", "all") == "all" else or_
         column_index = int(kwargs["order"][0]["column"])
         if column_index < len(properties):
-            order_property = getattr(model, properties[column_index])
-            order_function = getattr(order_property, kwargs["order"][0]["dir"], None)
+            order_property = properties[column_index]
+            direction = kwargs["order"][0]["dir"]
+            if table == "task" and order_property == "status":
+                order_property = "is_active"
+                direction = "desc" if direction == "asc" else "asc"
+            order_function = getattr(getattr(model, order_property), direction, None)
         else:
             order_function = None
         constraints = self.build_filtering_constraints(table, **kwargs)
@@ -505,6 +535,8 @@ class BaseController:
         if table == "run":
             constraints.append(models["run"].children.any())
         result = Session.query(model).filter(operator(*constraints))
+        if table in ("event", "task"):
+            result = result.options(joinedload(model.service))
         if order_function:
             result = result.order_by(order_function())
         return {
@@ -557,38 +589,56 @@ class BaseController:
         server.close()
 
     def str_dict(self, input, depth=0):
+        fragments = []
+        self.build_str_dict(input, depth, fragments)
+        return "".join(fragments)
+
+    def build_str_dict(self, input, depth, fragments):
         tab = "\t" * depth
         if isinstance(input, list):
-            result = "\n"
+            fragments.append("\n")
             for element in input:
-                result += f"{tab}- {self.str_dict(element, depth + 1)}\n"
-            return result
+                fragments.append(f"{tab}- ")
+                self.build_str_dict(element, depth + 1, fragments)
+                fragments.append("\n")
         elif isinstance(input, dict):
-            result = ""
             for key, value in input.items():
-                result += f"\n{tab}{key}: {self.str_dict(value, depth + 1)}"
-            return result
+                fragments.append(f"\n{tab}{key}: ")
+                self.build_str_dict(value, depth + 1, fragments)
         else:
-            return str(input)
+            fragments.append(str(input))
 
     def strip_all(self, input):
         return input.translate(str.maketrans("", "", f"{punctuation} "))
 
-    def update_database_configurations_from_git(self):
-        for dir in scandir(self.path / "network_data"):
-            if dir.name == ".git":
+    @staticmethod
+    def read_git_device_data(path):
+        with open(Path(path) / "data.yml") as data:
+            parameters = yaml.load(data)
+        for data in ("configuration", "operational_data"):
+            filepath = Path(path) / data
+            if not filepath.exists():
                 continue
-            device = fetch("device", allow_none=True, name=dir.name)
-            if device:
-                with open(Path(dir.path) / "data.yml") as data:
-                    parameters = yaml.load(data)
-                    device.update(**{"dont_update_pools": True, **parameters})
-                for data in ("configuration", "operational_data"):
-                    filepath = Path(dir.path) / data
-                    if not filepath.exists():
-                        continue
-                    with open(filepath) as file:
-                        setattr(device, data, file.read())
+            with open(filepath) as file:
+                parameters[data] = file.read()
+        return parameters
+
+    def update_database_configurations_from_git(self):
+        devices = {device.name: device for device in fetch_all("device")}
+        directories = [
+            dir.path
+            for dir in scandir(self.path / "network_data")
+            if dir.name != ".git" and dir.name in devices
+        ]
+        if directories:
+            pool = ThreadPool(processes=min(len(directories), 16))
+            devices_data = pool.map(self.read_git_device_data, directories)
+            pool.close()
+            pool.join()
+            for path, parameters in zip(directories, devices_data):
+                devices[Path(path).name].update(
+                    **{"dont_update_pools": True, **parameters}
+                )
         Session.commit()
         for pool in fetch_all("pool"):
             if pool.device_configuration or pool.device_operational_data:
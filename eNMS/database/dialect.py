@@ -1,6 +1,9 @@
-from sqlalchemy import Column as SQLA_Column, PickleType, String, Text
+from json import dumps, loads
+from pickle import loads as pickle_loads
+from sqlalchemy import Column as SQLA_Column, LargeBinary, PickleType, String, Text
 from sqlalchemy.dialects.mysql.base import MSMediumBlob
 from sqlalchemy.ext.mutable import MutableDict, MutableList
+from sqlalchemy.types import TypeDecorator
 
 from eNMS.config import config
 from eNMS.database import DIALECT
@@ -11,6 +14,22 @@ class CustomPickleType(PickleType):
         impl = MSMediumBlob
 
 
+class JSONPickleType(TypeDecorator):
+    impl = MSMediumBlob if DIALECT == "mysql" else LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else dumps(value).encode("utf-8")
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return loads(value)
+        except ValueError:
+            return pickle_loads(value)
+
+
+JSONMutableDict = MutableDict.as_mutable(JSONPickleType)
 MutableDict = MutableDict.as_mutable(CustomPickleType)
 MutableList = MutableList.as_mutable(CustomPickleType)
 LargeString = Text(config["database"]["large_string_length"])
@@ -18,6 +37,7 @@ SmallString = String(config["database"]["small_string_length"])
 
 
 default_ctypes = {
+    JSONMutableDict: {},
     MutableDict: {},
     MutableList: [],
     LargeString: "",
@@ -3,6 +3,7 @@ from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.types import JSON
 
 from eNMS.database import Base
+from eNMS.database.dialect import JSONPickleType
 from eNMS.models import model_properties, models, property_types, relationships
 from eNMS.properties import private_properties
 from eNMS.properties.database import dont_track_changes
@@ -21,6 +22,7 @@ def model_inspection(mapper, cls):
                 Integer: "int",
                 Float: "float",
                 JSON: "dict",
+                JSONPickleType: "dict",
                 PickleType: "dict",
             }.get(type(col.type), "str")
             if col.key not in property_types:
@@ -30,8 +30,24 @@ def get_query_count(query):
     return query.session.execute(count_query).scalar()
 
 
-def objectify(model, object_list):
-    return [fetch(model, id=object_id) for object_id in object_list]
+def batch_fetch(model, object_ids, *options):
+    object_ids = {int(object_id) for object_id in object_ids}
+    if not object_ids:
+        return {}
+    query = Session.query(models[model]).filter(models[model].id.in_(object_ids))
+    instances = {instance.id: instance for instance in query.options(*options)}
+    missing_ids = object_ids - set(instances)
+    if missing_ids:
+        raise Exception(
+            f"There is no {model} in the database "
+            f"with the following IDs: {sorted(missing_ids)}"
+        )
+    return instances
+
+
+def objectify(model, object_list, *options):
+    instances = batch_fetch(model, object_list, *options)
+    return [instances[int(object_id)] for object_id in object_list]
 
 
 def delete(model, allow_none=False, **kwargs):
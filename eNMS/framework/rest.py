@@ -1,4 +1,3 @@
-from datetime import datetime
 from flask import request
 from flask_restful import abort, Api, Resource
 from logging import info
@@ -8,6 +7,7 @@ from eNMS import app
 from eNMS.database import Session
 from eNMS.database.functions import delete, factory, fetch
 from eNMS.framework.extensions import auth, csrf
+from eNMS.models import models
 
 
 def create_app_resources():
@@ -60,7 +60,13 @@ class Query(Resource):
 
     def get(self, cls):
         try:
-            results = fetch(cls, all_matches=True, **request.args.to_dict())
+            kwargs, model = request.args.to_dict(), models[cls]
+            query = Session.query(model)
+            if cls == "task" and "status" in kwargs:
+                query = query.filter(model.status_constraint(kwargs.pop("status")))
+            results = query.filter_by(**kwargs).all()
+            if not results:
+                raise Exception
             return [result.get_properties(exclude=["positions"]) for result in results]
         except Exception:
             return abort(404, message=f"There are no such {cls}s.")
@@ -156,14 +162,8 @@ class RunService(Resource):
             data.update({"devices": devices, "pools": pools})
         data["runtime"] = runtime = app.get_time()
         if handle_asynchronously:
-            app.scheduler.add_job(
-                id=runtime,
-                func=app.run,
-                run_date=datetime.now(),
-                args=[service.id],
-                kwargs=data,
-                trigger="date",
-            )
+            if not app.schedule_run(service.id, **data):
+                return {"errors": ["Too many services running: try again later."]}
             return {"errors": errors, "runtime": runtime}
         else:
             return {**app.run(service.id, **data), "errors": errors}
@@ -16,7 +16,7 @@ from re import compile, search
 from requests import post
 from scp import SCPClient
 from slackclient import SlackClient
-from sqlalchemy import Boolean, ForeignKey, Integer
+from sqlalchemy import Boolean, ForeignKey, Index, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 from time import sleep
@@ -26,7 +26,11 @@ from xml.parsers.expat import ExpatError
 
 from eNMS import app
 from eNMS.database import Session
-from eNMS.database.associations import run_pool_table, run_device_table
+from eNMS.database.associations import (
+    pool_device_table,
+    run_pool_table,
+    run_device_table,
+)
 from eNMS.database.dialect import Column, MutableDict, MutableList, SmallString
 from eNMS.database.functions import factory, fetch
 from eNMS.database.base import AbstractBase
@@ -57,6 +61,7 @@ class Result(AbstractBase):
     workflow_id = Column(Integer, ForeignKey("workflow.id", ondelete="cascade"))
     workflow = relationship("Workflow", foreign_keys="Result.workflow_id")
     workflow_name = association_proxy("workflow", "name")
+    __table_args__ = (Index("ix_result_run_id_device_id", run_id, device_id),)
 
     def __repr__(self):
         return f"{self.service_name} on {self.device_name}"
@@ -171,8 +176,13 @@ class Run(AbstractBase):
             raise AttributeError
 
     def result(self, device=None):
-        result = [r for r in self.results if r.device_name == device]
-        return result.pop() if result else None
+        result = models["result"]
+        query = Session.query(result).filter(result.run_id == self.id)
+        if device:
+            query = query.join(result.device).filter(models["device"].name == device)
+        else:
+            query = query.filter(result.device_id.is_(None))
+        return query.order_by(result.id.desc()).first()
 
     def generate_row(self, **kwargs):
         return super().generate_row() + [
@@ -239,10 +249,19 @@ class Run(AbstractBase):
             raise Exception(f"Device query invalid targets: {', '.join(not_found)}")
         return devices
 
+    @staticmethod
+    def get_pools_devices(pools):
+        if not pools:
+            return set()
+        query = (
+            Session.query(models["device"])
+            .join(pool_device_table)
+            .filter(pool_device_table.c.pool_id.in_([pool.id for pool in pools]))
+        )
+        return set(query.all())
+
     def compute_devices(self, payload):
-        devices = set(self.devices)
-        for pool in self.pools:
-            devices |= set(pool.devices)
+        devices = set(self.devices) | self.get_pools_devices(self.pools)
         if not devices:
             if self.service.device_query:
                 devices |= self.compute_devices_from_query(
@@ -251,8 +270,7 @@ class Run(AbstractBase):
                     payload=payload,
                 )
             devices |= set(self.service.devices)
-            for pool in self.service.pools:
-                devices |= set(pool.devices)
+            devices |= self.get_pools_devices(self.service.pools)
         return list(devices)
 
     def init_state(self):
@@ -841,17 +859,16 @@ class Run(AbstractBase):
             return
         if self.start_new_connection:
             return self.disconnect(library, device, connection)
-        if library == "napalm":
-            if connection.is_alive():
-                return connection
+        try:
+            if library == "napalm":
+                alive = connection.is_alive()["is_alive"]
             else:
-                self.disconnect(library, device, connection)
-        else:
-            try:
-                connection.find_prompt()
-                return connection
-            except Exception:
-                self.disconnect(library, device, connection)
+                alive = connection.is_alive()
+        except Exception:
+            alive = False
+        if alive:
+            return connection
+        self.disconnect(library, device, connection)
 
     def get_connection(self, library, device):
         cache = app.connections_cache[library].get(self.parent_runtime, {})
@@ -1,26 +1,122 @@
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from functools import lru_cache
 from re import search
-from sqlalchemy import Boolean, case, ForeignKey, Integer
+from sqlalchemy import Boolean, event, ForeignKey, inspect, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
+from time import time
 
 from eNMS import app
 from eNMS.database import Session
-from eNMS.database.dialect import Column, LargeString, MutableDict, SmallString
+from eNMS.database.dialect import Column, JSONMutableDict, LargeString, SmallString
 from eNMS.database.associations import (
     task_device_table,
     task_pool_table,
 )
 from eNMS.database.base import AbstractBase
 
+CRON_DAYS = {
+    "0": "sun",
+    "1": "mon",
+    "2": "tue",
+    "3": "wed",
+    "4": "thu",
+    "5": "fri",
+    "6": "sat",
+    "7": "sun",
+    "*": "*",
+}
+
+FREQUENCY_UNIT_SECONDS = {"seconds": 1, "minutes": 60, "hours": 3600, "days": 86400}
+
+SCHEDULING_PROPERTIES = (
+    "aps_job_id",
+    "crontab_expression",
+    "devices",
+    "end_date",
+    "frequency",
+    "frequency_unit",
+    "initial_payload",
+    "is_active",
+    "pools",
+    "scheduling_mode",
+    "service",
+    "start_date",
+)
+
+
+@lru_cache(maxsize=512)
+def cron_trigger(expression):
+    return CronTrigger.from_crontab(expression)
+
+
+TASK_ROW_BUTTONS = """
+            <ul class="pagination pagination-lg" style="margin: 0px; width: 250px">
+          <li>
+            <button type="button" class="btn btn-success
+            %(play)s"
+            %(play)s
+            onclick="resumeTask('%(id)s')" data-tooltip="Play"
+              ><span class="glyphicon glyphicon-play"></span
+            ></button>
+          </li>
+          <li>
+            <button type="button" class="btn btn-default
+            %(pause)s"
+            %(pause)s
+            onclick="pauseTask('%(id)s')" data-tooltip="Pause"
+              ><span class="glyphicon glyphicon-pause"></span
+            ></button>
+          </li>
+          <li>
+            <button type="button" class="btn btn-primary"
+            onclick="showTypePanel('task', '%(id)s')" data-tooltip="Edit"
+              ><span class="glyphicon glyphicon-edit"></span
+            ></button>
+          </li>
+          <li>
+            <button type="button" class="btn btn-primary"
+            onclick="showTypePanel('task', '%(id)s', 'duplicate')"
+            data-tooltip="Duplicate">
+            <span class="glyphicon glyphicon-duplicate"></span></button>
+          </li>
+          <li>
+            <button type="button" class="btn btn-danger"
+            onclick="showDeletionPanel(%(row_properties)s)" data-tooltip="Delete"
+              ><span class="glyphicon glyphicon-trash"></span
+            ></button>
+          </li>
+        </ul>"""
+
+EVENT_ROW_BUTTONS = """
+            <ul class="pagination pagination-lg" style="margin: 0px; width: 150px">
+          <li>
+            <button type="button" class="btn btn-primary"
+            onclick="showTypePanel('event', '%(id)s')" data-tooltip="Edit"
+              ><span class="glyphicon glyphicon-edit"></span
+            ></button>
+          </li>
+          <li>
+            <button type="button" class="btn btn-primary"
+            onclick="showTypePanel('event', '%(id)s', 'duplicate')"
+            data-tooltip="Duplicate">
+            <span class="glyphicon glyphicon-duplicate"></span></button>
+          </li>
+          <li>
+            <button type="button" class="btn btn-danger"
+            onclick="showDeletionPanel(%(row_properties)s)" data-tooltip="Delete"
+              ><span class="glyphicon glyphicon-trash"></span
+            ></button>
+          </li>
+        </ul>"""
+
 
 class Task(AbstractBase):
 
     __tablename__ = type = "task"
     id = Column(Integer, primary_key=True)
-    aps_job_id = Column(SmallString)
+    aps_job_id = Column(SmallString, index=True)
     name = Column(SmallString, unique=True)
     description = Column(SmallString)
     creation_time = Column(SmallString)
@@ -31,8 +127,8 @@ class Task(AbstractBase):
     start_date = Column(SmallString)
     end_date = Column(SmallString)
     crontab_expression = Column(SmallString)
-    is_active = Column(Boolean, default=False)
-    initial_payload = Column(MutableDict)
+    is_active = Column(Boolean, default=False, index=True)
+    initial_payload = Column(JSONMutableDict)
     devices = relationship(
         "Device", secondary=task_device_table, back_populates="tasks"
     )
@@ -50,99 +146,98 @@ class Task(AbstractBase):
 
     def update(self, **kwargs):
         super().update(**kwargs)
-        if self.is_active:
+        if self.is_active and self.scheduling_changed:
             self.schedule()
 
     def delete(self):
-        if app.scheduler.get_job(self.aps_job_id):
+        try:
             app.scheduler.remove_job(self.aps_job_id)
+        except JobLookupError:
+            pass
         Session.commit()
 
     def generate_row(self, **kwargs):
+        play, pause = (
+            ("disabled", "active") if self.is_active else ("active", "disabled")
+        )
         return super().generate_row() + [
-            f"""
-            <ul class="pagination pagination-lg" style="margin: 0px; width: 250px">
-          <li>
-            <button type="button" class="btn btn-success
-            {'disabled' if self.is_active else 'active'}"
-            {'disabled' if self.is_active else 'active'}
-            onclick="resumeTask('{self.id}')" data-tooltip="Play"
-              ><span class="glyphicon glyphicon-play"></span
-            ></button>
-          </li>
-          <li>
-            <button type="button" class="btn btn-default
-            {'active' if self.is_active else 'disabled'}"
-            {'active' if self.is_active else 'disabled'}
-            onclick="pauseTask('{self.id}')" data-tooltip="Pause"
-              ><span class="glyphicon glyphicon-pause"></span
-            ></button>
-          </li>
-          <li>
-            <button type="button" class="btn btn-primary"
-            onclick="showTypePanel('task', '{self.id}')" data-tooltip="Edit"
-              ><span class="glyphicon glyphicon-edit"></span
-            ></button>
-          </li>
-          <li>
-            <button type="button" class="btn btn-primary"
-            onclick="showTypePanel('task', '{self.id}', 'duplicate')"
-            data-tooltip="Duplicate">
-            <span class="glyphicon glyphicon-duplicate"></span></button>
-          </li>
-          <li>
-            <button type="button" class="btn btn-danger"
-            onclick="showDeletionPanel({self.row_properties})" data-tooltip="Delete"
-              ><span class="glyphicon glyphicon-trash"></span
-            ></button>
-          </li>
-        </ul>"""
+            TASK_ROW_BUTTONS
+            % {
+                "id": self.id,
+                "play": play,
+                "pause": pause,
+                "row_properties": self.row_properties,
+            }
         ]
 
-    @hybrid_property
+    @property
+    def scheduling_changed(self):
+        state = inspect(self)
+        return not state.persistent or any(
+            state.attrs[property].history.has_changes()
+            for property in SCHEDULING_PROPERTIES
+        )
+
+    @property
     def status(self):
         return "Active" if self.is_active else "Inactive"
 
-    @status.expression
-    def status(cls):  # noqa: N805
-        return case([(cls.is_active, "Active")], else_="Inactive")
+    @classmethod
+    def status_constraint(cls, value, filter="equality"):
+        statuses = ("Active", "Inactive")
+        if filter == "equality":
+            matches = [status for status in statuses if status == value]
+        elif not filter or filter == "inclusion":
+            # Case-insensitive, unlike contains on other columns under PostgreSQL
+            value = value.lower()
+            matches = [status for status in statuses if value in status.lower()]
+        else:
+            matches = [status for status in statuses if search(value, status)]
+        return cls.is_active.in_([status == "Active" for status in matches])
+
+    @property
+    def aps_job(self):
+        if "_aps_job" not in self.__dict__:
+            self.__dict__["_aps_job"] = app.scheduler.get_job(self.aps_job_id)
+        return self.__dict__["_aps_job"]
+
+    @aps_job.setter
+    def aps_job(self, job):
+        self.__dict__["_aps_job"] = job
 
     @property
     def next_run_time(self):
-        job = app.scheduler.get_job(self.aps_job_id)
+        job = self.aps_job
         if job and job.next_run_time:
             return job.next_run_time.strftime("%Y-%m-%d %H:%M:%S")
         return None
 
     @property
     def time_before_next_run(self):
-        job = app.scheduler.get_job(self.aps_job_id)
+        job = self.aps_job
         if job and job.next_run_time:
-            delta = job.next_run_time.replace(tzinfo=None) - datetime.now()
-            hours, remainder = divmod(delta.seconds, 3600)
+            delta = max(int(job.next_run_time.timestamp() - time()), 0)
+            days, remainder = divmod(delta, 86400)
+            hours, remainder = divmod(remainder, 3600)
             minutes, seconds = divmod(remainder, 60)
-            days = f"{delta.days} days, " if delta.days else ""
+            days = f"{days} days, " if days else ""
             return f"{days}{hours}h:{minutes}m:{seconds}s"
         return None
 
-    def aps_conversion(self, date):
-        dt: datetime = datetime.strptime(date, "%d/%m/%Y %H:%M:%S")
-        return datetime.strftime(dt, "%Y-%m-%d %H:%M:%S")
-
     def aps_date(self, datetype):
         date = getattr(self, datetype)
-        return self.aps_conversion(date) if date else None
+        return f"{date[6:10]}-{date[3:5]}-{date[:2]} {date[11:19]}" if date else None
 
     def pause(self):
         self.is_active = False
-        Session.commit()
         app.scheduler.pause_job(self.aps_job_id)
+        self.__dict__.pop("_aps_job", None)
 
     def resume(self):
         self.schedule()
         app.scheduler.resume_job(self.aps_job_id)
+        self.__dict__.pop("_aps_job", None)
         self.is_active = True
-        Session.commit()
 
     def run_properties(self):
         properties = {"task": self.id, **self.initial_payload}
@@ -161,46 +256,38 @@ class Task(AbstractBase):
             "kwargs": self.run_properties(),
         }
         if self.scheduling_mode == "cron":
-            self.periodic = True
-            expression = self.crontab_expression.split()
-            mapping = {
-                "0": "sun",
-                "1": "mon",
-                "2": "tue",
-                "3": "wed",
-                "4": "thu",
-                "5": "fri",
-                "6": "sat",
-                "7": "sun",
-                "*": "*",
-            }
-            expression[-1] = ",".join(mapping[day] for day in expression[-1].split(","))
-            trigger = {"trigger": CronTrigger.from_crontab(" ".join(expression))}
-        elif self.frequency:
-            self.periodic = True
-            frequency_in_seconds = (
-                int(self.frequency)
-                * {"seconds": 1, "minutes": 60, "hours": 3600, "days": 86400}[
-                    self.frequency_unit
-                ]
-            )
-            trigger = {
-                "trigger": "interval",
-                "start_date": self.aps_date("start_date"),
-                "end_date": self.aps_date("end_date"),
-                "seconds": frequency_in_seconds,
-            }
+            mode = "cron"
         else:
-            self.periodic = False
-            trigger = {"trigger": "date", "run_date": self.aps_date("start_date")}
-        return default, trigger
+            mode = "interval" if self.frequency else "date"
+        self.periodic = mode != "date"
+        return default, getattr(self, f"get_{mode}_trigger")()
+
+    def get_cron_trigger(self):
+        expression = self.crontab_expression.split()
+        expression[-1] = ",".join(CRON_DAYS[day] for day in expression[-1].split(","))
+        return {"trigger": cron_trigger(" ".join(expression))}
+
+    def get_date_trigger(self):
+        return {"trigger": "date", "run_date": self.aps_date("start_date")}
+
+    def get_interval_trigger(self):
+        unit_in_seconds = FREQUENCY_UNIT_SECONDS[self.frequency_unit]
+        return {
+            "trigger": "interval",
+            "start_date": self.aps_date("start_date"),
+            "end_date": self.aps_date("end_date"),
+            "seconds": int(self.frequency) * unit_in_seconds,
+        }
 
     def schedule(self):
         default, trigger = self.kwargs()
-        if not app.scheduler.get_job(self.aps_job_id):
-            app.scheduler.add_job(**{**default, **trigger})
-        else:
-            app.scheduler.reschedule_job(default.pop("id"), **trigger)
+        app.scheduler.add_job(**default, **trigger)
+        self.__dict__.pop("_aps_job", None)
+
+
+@event.listens_for(Task, "expire")
+def reset_aps_job(task, attributes):
+    task.__dict__.pop("_aps_job", None)
 
 
 class Changelog(AbstractBase):
@@ -209,13 +296,13 @@ class Changelog(AbstractBase):
     type = Column(SmallString)
     __mapper_args__ = {"polymorphic_identity": "changelog", "polymorphic_on": type}
     id = Column(Integer, primary_key=True)
-    time = Column(SmallString)
+    time = Column(SmallString, index=True)
     content = Column(LargeString, default="")
     severity = Column(SmallString, default="debug")
     user = Column(SmallString, default="admin")
 
     def update(self, **kwargs):
-        kwargs["time"] = str(datetime.now())
+        kwargs["time"] = app.get_time()
         super().update(**kwargs)
 
 
@@ -234,27 +321,7 @@ class Event(AbstractBase):
 
     def generate_row(self, **kwargs):
         return super().generate_row() + [
-            f"""
-            <ul class="pagination pagination-lg" style="margin: 0px; width: 150px">
-          <li>
-            <button type="button" class="btn btn-primary"
-            onclick="showTypePanel('event', '{self.id}')" data-tooltip="Edit"
-              ><span class="glyphicon glyphicon-edit"></span
-            ></button>
-          </li>
-          <li>
-            <button type="button" class="btn btn-primary"
-            onclick="showTypePanel('event', '{self.id}', 'duplicate')"
-            data-tooltip="Duplicate">
-            <span class="glyphicon glyphicon-duplicate"></span></button>
-          </li>
-          <li>
-            <button type="button" class="btn btn-danger"
-            onclick="showDeletionPanel({self.row_properties})" data-tooltip="Delete"
-              ><span class="glyphicon glyphicon-trash"></span
-            ></button>
-          </li>
-        </ul>"""
+            EVENT_ROW_BUTTONS % {"id": self.id, "row_properties": self.row_properties}
         ]
 
     def match_log(self, source, content):
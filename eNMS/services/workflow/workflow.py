@@ -1,9 +1,10 @@
 from collections import defaultdict
-from sqlalchemy import Boolean, ForeignKey, Integer
+from sqlalchemy import Boolean, ForeignKey, insert, Integer
 from sqlalchemy.orm import backref, relationship
 from time import sleep
 from wtforms import BooleanField, HiddenField, SelectField
 
+from eNMS import app
 from eNMS.database import Session
 from eNMS.database.base import AbstractBase
 from eNMS.database.dialect import Column, MutableDict, SmallString
@@ -69,19 +70,21 @@ class Workflow(Service):
             )
             clone_services[service.id] = service_clone
         Session.commit()
-        for edge in self.edges:
-            clone.edges.append(
-                factory(
-                    "workflow_edge",
-                    **{
-                        "workflow": clone.id,
-                        "subtype": edge.subtype,
-                        "source": clone_services[edge.source.id].id,
-                        "destination": clone_services[edge.destination.id].id,
-                    },
-                )
-            )
-            Session.commit()
+        edges = [
+            {
+                "workflow_id": clone.id,
+                "label": edge.subtype,
+                "subtype": edge.subtype,
+                "source_id": clone_services[edge.source_id].id,
+                "destination_id": clone_services[edge.destination_id].id,
+            }
+            for edge in self.edges
+        ]
+        if edges:
+            Session.execute(insert(WorkflowEdge.__table__), edges)
+            Session.expire(clone, ["edges"])
+            app.log("info", f"CREATION: {len(edges)} edges in '{clone.name}'")
+        Session.commit()
         return clone
 
     @property
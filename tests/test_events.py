@@ -1,8 +1,13 @@
+from base64 import b64encode
+from pytest import raises
+from threading import BoundedSemaphore, Event
+from time import sleep
 from werkzeug.datastructures import ImmutableMultiDict
 
 from eNMS import app
 from eNMS.database import Session
-from eNMS.database.functions import fetch_all
+from eNMS.database.functions import fetch, fetch_all
+from eNMS.models import models
 
 from tests.conftest import check_pages
 from tests.test_inventory import create_from_file
@@ -32,6 +37,8 @@ scheduled_task = ImmutableMultiDict(
     ]
 )
 
+run_started, run_released = Event(), Event()
+
 
 @check_pages("table/task")
 def test_netmiko_napalm_config(user_client):
@@ -42,6 +49,54 @@ def test_netmiko_napalm_config(user_client):
     assert len(fetch_all("task")) == 4
 
 
+def test_task_action(user_client):
+    create_from_file(user_client, "europe.xls")
+    end_date = "06/04/2118 19:10:13"
+    for name in ("first_task", "second_task"):
+        data = {**scheduled_task.to_dict(), "name": name, "end_date": end_date}
+        user_client.post("/update/task", data=ImmutableMultiDict(data))
+    first, second = fetch("task", name="first_task"), fetch("task", name="second_task")
+    task_ids = f"{first.id}-{second.id}"
+    user_client.post(f"/task_action/resume/{task_ids}")
+    assert first.is_active and second.is_active
+    app.scheduler.remove_job(first.aps_job_id)
+    response = user_client.post(f"/task_action/pause/{task_ids}")
+    assert response.json == {"alert": "These tasks no longer exist: first_task."}
+    assert not second.is_active
+    assert app.scheduler.get_job(second.aps_job_id).next_run_time is None
+    user_client.post(f"/task_action/resume/{task_ids}")
+    assert first.is_active and second.is_active
+    assert app.scheduler.get_job(first.aps_job_id)
+
+
+def test_task_rescheduling(user_client, monkeypatch):
+    create_from_file(user_client, "europe.xls")
+    user_client.post("/update/task", data=scheduled_task)
+    task = fetch("task", name="scheduled_task")
+    task_id, job_id = task.id, task.aps_job_id
+    user_client.post(f"/task_action/resume/{task_id}")
+    calls, schedule = [], models["task"].schedule
+
+    def count_schedule(task):
+        calls.append(task.name)
+        schedule(task)
+
+    monkeypatch.setattr(models["task"], "schedule", count_schedule)
+
+    def edit_task(**properties):
+        data = {**scheduled_task.to_dict(), "id": task_id, **properties}
+        user_client.post("/update/task", data=ImmutableMultiDict(data))
+
+    edit_task(description="new description")
+    assert not calls
+    edit_task(frequency="60")
+    assert len(calls) == 1
+    assert app.scheduler.get_job(job_id).trigger.interval.total_seconds() == 60
+    edit_task(frequency="60", initial_payload='{"key": "value"}')
+    assert len(calls) == 2
+    assert app.scheduler.get_job(job_id).kwargs["key"] == "value"
+
+
 @check_pages("table/changelog")
 def test_create_logs(user_client):
     number_of_logs = len(fetch_all("changelog"))
@@ -49,3 +104,86 @@ def test_create_logs(user_client):
         app.log("warning", str(i))
         Session.commit()
     assert len(fetch_all("changelog")) == number_of_logs + 10
+
+
+def blocking_run(service_id, **kwargs):
+    run_started.set()
+    run_released.wait(5)
+
+
+def wait_for_run_end(runtime):
+    for _ in range(50):
+        if runtime not in app.inflight_runs:
+            return True
+        sleep(0.1)
+
+
+def test_run_slot_release(user_client, monkeypatch):
+    monkeypatch.setattr(app, "run_slots", BoundedSemaphore(1))
+    monkeypatch.setattr(app, "run", blocking_run)
+    assert app.schedule_run(2, runtime="first_run")
+    assert run_started.wait(5)
+    sleep(0.5)
+    assert not app.schedule_run(2, runtime="second_run")
+    assert "first_run" in app.inflight_runs
+    run_released.set()
+    assert wait_for_run_end("first_run")
+    assert app.schedule_run(2, runtime="third_run")
+    assert wait_for_run_end("third_run")
+    app.scheduler.pause()
+    try:
+        assert app.schedule_run(2, runtime="cancelled_run")
+        assert app.stop_workflow("cancelled_run")
+        assert not app.scheduler.get_job("cancelled_run")
+    finally:
+        app.scheduler.resume()
+    assert "cancelled_run" not in app.inflight_runs
+
+    def add_job(**kwargs):
+        raise ValueError
+
+    with monkeypatch.context() as patch:
+        patch.setattr(app.scheduler, "add_job", add_job)
+        with raises(ValueError):
+            app.schedule_run(2, runtime="failed_run")
+    assert "failed_run" not in app.inflight_runs
+    assert app.schedule_run(2, runtime="last_run")
+    assert wait_for_run_end("last_run")
+
+
+def test_task_status_filtering(user_client):
+    create_from_file(user_client, "europe.xls")
+    user_client.post("/update/task", data=instant_task)
+    user_client.post("/update/task", data=scheduled_task)
+    tasks = fetch_all("task")
+    tasks[0].is_active = True
+    Session.commit()
+    active = {task.name for task in tasks if task.status == "Active"}
+    inactive = {task.name for task in tasks} - active
+    model = models["task"]
+
+    def filter_tasks(value, filter):
+        form = {"status": value, "status_filter": filter}
+        constraints = app.build_filtering_constraints("task", form=form)
+        return {task.name for task in Session.query(model).filter(*constraints)}
+
+    assert filter_tasks("Active", "equality") == active
+    assert filter_tasks("nacti", "inclusion") == inactive
+    assert filter_tasks("^Act", "regex") == active
+    assert filter_tasks("^ctive", "regex") == set()
+    assert app.count_models()["properties"]["task"] == {
+        "Active": len(active),
+        "Inactive": len(inactive),
+    }
+    credentials = b64encode(b"admin:admin").decode()
+    response = user_client.get(
+        "/rest/query/task?status=Inactive",
+        headers={"Authorization": f"Basic {credentials}"},
+    )
+    assert {task["name"] for task in response.json} == inactive
+    response = user_client.get(
+        "/rest/query/task?status=Inactive&name=doesnotexist",
+        headers={"Authorization": f"Basic {credentials}"},
+    )
+    assert response.status_code == 404
+    assert response.json == {"message": "There are no such tasks."}